@@ -0,0 +1,87 @@
+"""Line-oriented console input driven by an asyncio event loop.
+
+Instead of blocking a thread in ``input()``, the standard input file descriptor
+is registered with the event loop next to the sockets and read with
+``os.read`` whenever it is readable. Complete lines are handed over as bytes.
+
+Classes:
+    ConsoleReader: Reads stdin from the event loop and dispatches its lines.
+
+Example:
+    reader = ConsoleReader(on_line=handle_line, on_eof=stop)
+    reader.start(asyncio.get_running_loop())
+"""
+
+import asyncio
+import os
+import sys
+from typing import Callable
+
+
+class ConsoleReader:
+    """Reads stdin from the event loop and dispatches its lines.
+
+    Attributes:
+        on_line (Callable[[bytes], None]): Called with every line, without its
+            line terminator.
+        on_eof (Callable[[], None]): Called once stdin reaches end of file, if
+            given; reading stops there either way.
+        fd (int): The file descriptor read from.
+    """
+
+    def __init__(
+        self,
+        on_line: Callable[[bytes], None],
+        on_eof: Callable[[], None] = None,
+        fd: int = None,
+    ) -> None:
+        self.on_line: Callable[[bytes], None] = on_line
+        self.on_eof: Callable[[], None] = on_eof
+        self.fd: int = sys.stdin.fileno() if fd is None else fd
+        self._inbuf: bytearray = bytearray()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._polled: bool = False
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start reading stdin from ``loop``.
+
+        Regular files cannot be watched by epoll; as they are always
+        readable they are read from loop callbacks until end of file.
+        """
+        self._loop = loop
+        try:
+            loop.add_reader(self.fd, self._on_readable)
+            self._polled = True
+        except PermissionError:
+            loop.call_soon(self._on_readable)
+
+    def stop(self) -> None:
+        """Stop reading stdin."""
+        if self._polled:
+            self._loop.remove_reader(self.fd)
+            self._polled = False
+        self._loop = None
+
+    def _on_readable(self) -> None:
+        """Read what stdin holds and dispatch the complete lines."""
+        if self._loop is None:
+            return
+        data = os.read(self.fd, 4096)
+        if not data:
+            if self._inbuf:
+                self.on_line(bytes(self._inbuf))
+                self._inbuf.clear()
+            self.stop()
+            if self.on_eof is not None:
+                self.on_eof()
+            return
+        self._inbuf += data
+        start = 0
+        end = self._inbuf.find(b"\n")
+        while end != -1 and self._loop is not None:
+            self.on_line(bytes(self._inbuf[start:end]))
+            start = end + 1
+            end = self._inbuf.find(b"\n", start)
+        del self._inbuf[:start]
+        if self._loop is not None and not self._polled:
+            self._loop.call_soon(self._on_readable)
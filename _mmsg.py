@@ -0,0 +1,299 @@
+"""Batched datagram I/O through recvmmsg(2) and sendmmsg(2).
+
+This module wraps the Linux recvmmsg and sendmmsg system calls with ctypes
+so that a burst of datagrams can be received, and echoed back, with a single
+system call each instead of one recvfrom and one sendto per datagram. Bursts
+of large datagrams can be echoed with MSG_ZEROCOPY, lending the receive
+buffers to the kernel until it reports the transmission complete.
+
+Attributes:
+    available (bool): Whether the running libc exposes recvmmsg and sendmmsg.
+    SOCKADDR_SIZE (int): The room reserved for a raw socket address.
+
+Functions:
+    decode_address: Convert a raw socket address into a socket module tuple.
+    enable_zerocopy: Allow MSG_ZEROCOPY sends on a socket.
+
+Classes:
+    IOVec: The struct iovec of the C library.
+    MsgHdr: The struct msghdr of the C library.
+    DatagramBatch: Preallocated message vectors for receiving and echoing a burst.
+
+Example:
+    if available:
+        batch = DatagramBatch(prefix=b"Echo: ")
+        count = batch.receive(sock.fileno())
+        batch.echo(sock.fileno(), count)
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+MSG_ERRQUEUE = getattr(socket, "MSG_ERRQUEUE", 0x2000)
+MSG_ZEROCOPY = getattr(socket, "MSG_ZEROCOPY", 0x4000000)
+SO_ZEROCOPY = getattr(socket, "SO_ZEROCOPY", 60)
+SO_EE_ORIGIN_ZEROCOPY = 5
+_SOCK_EXTENDED_ERR = struct.Struct("=IBBBBII")
+SOCKADDR_SIZE = 128
+
+
+class IOVec(ctypes.Structure):
+    """The struct iovec of the C library."""
+
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    """The struct msghdr of the C library."""
+
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    """Return the libc handle exposing recvmmsg and sendmmsg, or None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        recvmmsg, sendmmsg = libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    recvmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.POINTER(_MMsgHdr),
+        ctypes.c_uint,
+        ctypes.c_int,
+        ctypes.c_void_p,
+    ]
+    sendmmsg.argtypes = [
+        ctypes.c_int,
+        ctypes.POINTER(_MMsgHdr),
+        ctypes.c_uint,
+        ctypes.c_int,
+    ]
+    return libc
+
+
+_libc = _load_libc()
+available = _libc is not None
+
+
+def decode_address(name: memoryview) -> tuple:
+    """Convert a raw socket address into the tuple the socket module uses.
+
+    Args:
+        name (memoryview): A sockaddr_in or sockaddr_in6 structure.
+
+    Returns:
+        tuple: The (host, port) pair, or (host, port, flowinfo, scope_id) for IPv6.
+    """
+    family = struct.unpack_from("=H", name)[0]
+    port = struct.unpack_from("!H", name, 2)[0]
+    if family == socket.AF_INET6:
+        flowinfo, host, scope_id = struct.unpack_from("!I16sI", name, 4)
+        return (socket.inet_ntop(family, host), port, flowinfo, scope_id)
+    return (socket.inet_ntop(socket.AF_INET, bytes(name[4:8])), port)
+
+
+def enable_zerocopy(sock: socket.socket) -> bool:
+    """Allow MSG_ZEROCOPY sends on ``sock``, returning whether the kernel agreed."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+    except OSError:
+        return False
+    return True
+
+
+class DatagramBatch:
+    """Preallocated message vectors for receiving and echoing a burst of datagrams.
+
+    Every slot owns a receive buffer and a socket address. The send side reuses
+    them as is, pointing its first iovec at the shared prefix and its second one
+    at the received payload, so echoing a burst copies nothing in user space.
+
+    A zero-copy echo also skips the copy into the kernel, which then reads the
+    slot buffers until it queues a completion on the socket error queue. The
+    slots get spare buffers meanwhile, and ``reap`` recycles the lent ones.
+
+    Attributes:
+        size (int): The maximum number of datagrams handled per system call.
+        bufsize (int): The capacity of each receive buffer.
+    """
+
+    def __init__(
+        self, size: int = 32, bufsize: int = 65536, prefix: bytes = b""
+    ) -> None:
+        self.size: int = size
+        self.bufsize: int = bufsize
+        self._prefix = ctypes.create_string_buffer(prefix, len(prefix))
+        self._buffers = [(ctypes.c_char * bufsize)() for _ in range(size)]
+        self._views = [memoryview(buffer).cast("B") for buffer in self._buffers]
+        self._spares: list = []
+        self._lent: dict = collections.defaultdict(dict)
+        self._sends: dict = collections.defaultdict(int)
+        self._names = (ctypes.c_char * (size * SOCKADDR_SIZE))()
+        self._rx_iov = (IOVec * size)()
+        self._tx_iov = (IOVec * (2 * size))()
+        self._rx = (_MMsgHdr * size)()
+        self._tx = (_MMsgHdr * size)()
+        self._names_view = memoryview(self._names).cast("B")
+        self._last_name: bytes = b""
+        self._last_address: tuple = None
+
+        names = ctypes.addressof(self._names)
+        for i in range(size):
+            self._rx_iov[i].iov_base = ctypes.addressof(self._buffers[i])
+            self._rx_iov[i].iov_len = bufsize
+            self._tx_iov[2 * i].iov_base = ctypes.addressof(self._prefix)
+            self._tx_iov[2 * i].iov_len = len(prefix)
+            self._tx_iov[2 * i + 1].iov_base = self._rx_iov[i].iov_base
+
+            rx_hdr = self._rx[i].msg_hdr
+            rx_hdr.msg_name = names + i * SOCKADDR_SIZE
+            rx_hdr.msg_iov = ctypes.pointer(self._rx_iov[i])
+            rx_hdr.msg_iovlen = 1
+
+            tx_hdr = self._tx[i].msg_hdr
+            tx_hdr.msg_name = rx_hdr.msg_name
+            tx_hdr.msg_iov = ctypes.pointer(self._tx_iov[2 * i])
+            tx_hdr.msg_iovlen = 2
+
+    def receive(self, fd: int) -> int:
+        """Receive up to ``size`` pending datagrams without blocking.
+
+        Args:
+            fd (int): The file descriptor of the UDP socket.
+
+        Returns:
+            int: The number of datagrams received, 0 when none is pending.
+
+        Raises:
+            OSError: If recvmmsg fails for another reason than an empty queue.
+        """
+        for i in range(self.size):
+            self._rx[i].msg_hdr.msg_namelen = SOCKADDR_SIZE
+        count = _libc.recvmmsg(fd, self._rx, self.size, MSG_DONTWAIT, None)
+        if count < 0:
+            error = ctypes.get_errno()
+            if error in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise OSError(error, os.strerror(error))
+        return count
+
+    def payload(self, index: int) -> memoryview:
+        """Return a view on the payload of the received datagram at ``index``."""
+        return self._views[index][: self._rx[index].msg_len]
+
+    def address(self, index: int) -> tuple:
+        """Return the sender address of the received datagram at ``index``.
+
+        The last decoded address is cached, so a burst from a single client
+        decodes its address, and allocates the tuple, only once.
+        """
+        start = index * SOCKADDR_SIZE
+        name = self._names_view[start : start + self._rx[index].msg_hdr.msg_namelen]
+        if name == self._last_name:
+            return self._last_address
+        self._last_name = name.tobytes()
+        self._last_address = decode_address(name)
+        return self._last_address
+
+    def echo(self, fd: int, count: int, zerocopy: bool = False) -> int:
+        """Send the first ``count`` received datagrams back, behind the prefix.
+
+        Args:
+            fd (int): The file descriptor of the UDP socket.
+            count (int): The number of received datagrams to echo.
+            zerocopy (bool): Send with MSG_ZEROCOPY, which the socket must have
+                been enabled for; falls back to copying when the kernel cannot
+                pin more pages.
+
+        Returns:
+            int: The number of datagrams sent; the rest of the burst is dropped
+                when the socket send buffer is full.
+
+        Raises:
+            OSError: If a datagram could not be sent for another reason than a
+                full buffer, such as a reply too long for UDP; the rest of the
+                burst is still sent, and the first such error is raised after.
+        """
+        for i in range(count):
+            self._tx[i].msg_hdr.msg_namelen = self._rx[i].msg_hdr.msg_namelen
+            self._tx_iov[2 * i + 1].iov_len = self._rx[i].msg_len
+        flags = MSG_DONTWAIT | (MSG_ZEROCOPY if zerocopy else 0)
+        sent = failure = 0
+        while sent < count:
+            done = _libc.sendmmsg(fd, ctypes.byref(self._tx[sent]), count - sent, flags)
+            if done < 0:
+                error = ctypes.get_errno()
+                if error in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if error == errno.EINTR:
+                    continue
+                if error == errno.ENOBUFS and flags & MSG_ZEROCOPY:
+                    flags &= ~MSG_ZEROCOPY
+                    continue
+                # sendmmsg only fails on its first datagram: skip it.
+                failure = failure or error
+                sent += 1
+                continue
+            if flags & MSG_ZEROCOPY:
+                self._lend(fd, sent, sent + done)
+            sent += done
+        if failure:
+            raise OSError(failure, os.strerror(failure))
+        return sent
+
+    def reap(self, sock: socket.socket) -> None:
+        """Recycle the buffers the kernel reports done with on ``sock``.
+
+        Drains the zero-copy completions from the socket error queue, which
+        also makes the socket poll readable while it holds any.
+        """
+        lent = self._lent[sock.fileno()]
+        while lent:
+            try:
+                _, ancdata, _, _ = sock.recvmsg(
+                    0, socket.CMSG_SPACE(64), MSG_ERRQUEUE | MSG_DONTWAIT
+                )
+            except (BlockingIOError, InterruptedError):
+                return
+            for _, _, data in ancdata:
+                _, origin, _, _, _, first, last = _SOCK_EXTENDED_ERR.unpack_from(data)
+                if origin != SO_EE_ORIGIN_ZEROCOPY:
+                    continue
+                for offset in range(((last - first) & 0xFFFFFFFF) + 1):
+                    buffer = lent.pop((first + offset) & 0xFFFFFFFF, None)
+                    if buffer is not None:
+                        self._spares.append(buffer)
+
+    def _lend(self, fd: int, start: int, end: int) -> None:
+        """Hand the buffers of slots ``start`` to ``end`` over to the kernel."""
+        lent = self._lent[fd]
+        for i in range(start, end):
+            lent[self._sends[fd]] = self._buffers[i]
+            self._sends[fd] = (self._sends[fd] + 1) & 0xFFFFFFFF
+            if self._spares:
+                buffer = self._spares.pop()
+            else:
+                buffer = (ctypes.c_char * self.bufsize)()
+            self._buffers[i] = buffer
+            self._views[i] = memoryview(buffer).cast("B")
+            self._rx_iov[i].iov_base = ctypes.addressof(buffer)
+            self._tx_iov[2 * i + 1].iov_base = self._rx_iov[i].iov_base
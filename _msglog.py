@@ -0,0 +1,86 @@
+"""Batched console output for received messages.
+
+Printing every received datagram costs a write system call and the stdout lock
+per message. This module queues the received messages and writes them to
+stdout in one go, either once a batch is full or shortly after the first
+message of a batch arrived.
+
+Classes:
+    MessageLog: Queue of received messages flushed to stdout in batches.
+
+Example:
+    log = MessageLog("Received message from {address}: {message}\\n")
+    log.append(address, payload)
+"""
+
+import asyncio
+import collections
+import sys
+
+
+class MessageLog:
+    """Queue of received messages flushed to stdout in batches.
+
+    Must be fed from an asyncio event loop, which schedules the delayed
+    flushes. A full batch is flushed from ``append`` itself, so no message is
+    dropped and a slow stdout holds up the event loop while it is written.
+
+    Attributes:
+        template (str): The line format, with an ``address`` field and a
+            ``message`` field after it.
+        batch (int): The number of pending messages triggering an immediate flush.
+        delay (float): The longest time in seconds a message waits for its flush.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        batch: int = 64,
+        delay: float = 0.01,
+    ) -> None:
+        self.template: str = template
+        self._head, _, tail = template.partition("{message}")
+        self._tail: bytes = tail.encode()
+        self.batch: int = batch
+        self.delay: float = delay
+        self._ring: collections.deque = collections.deque()
+        self._timer: asyncio.TimerHandle = None
+
+    def append(self, address: tuple, payload: bytes) -> None:
+        """Queue a received message for the next flush.
+
+        Args:
+            address (tuple): The address the message was received from.
+            payload (bytes): The message, copied out of the receive buffer.
+        """
+        self._ring.append((address, payload))
+        if len(self._ring) >= self.batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self.flush)
+
+    def flush(self) -> None:
+        """Write all the pending messages to stdout with a single write.
+
+        The payloads are written as received, without a decode and encode
+        round trip; the text before them is encoded once per sender run.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._ring:
+            return
+        parts = []
+        last_address = head = None
+        while self._ring:
+            address, payload = self._ring.popleft()
+            if head is None or address != last_address:
+                last_address = address
+                head = self._head.format(address=address).encode()
+            parts += (head, payload, self._tail)
+        try:
+            sys.stdout.flush()
+            sys.stdout.buffer.write(b"".join(parts))
+            sys.stdout.buffer.flush()
+        except Exception as general_error:
+            print(f"Failed to print the received messages: {general_error}")
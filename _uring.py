@@ -0,0 +1,393 @@
+"""Datagram echo through io_uring, driven by raw system calls with ctypes.
+
+This module sets up an io_uring instance for a UDP socket, keeps a receive
+outstanding for every buffer slot and echoes each completed receive back from
+the same slot. An eventfd registered with the ring becomes readable when
+completions are pending, so the ring plugs into an event loop like a socket
+does; with deferred task running the ring file descriptor itself is not woken.
+
+The ring asks for deferred, cooperative task running with a single issuer,
+which keeps completion handling on the calling thread, and for NAPI busy
+polling; kernels that refuse those get a plain ring or no ring at all.
+
+Attributes:
+    available (bool): Whether libc and an eventfd are at hand to drive io_uring.
+
+Classes:
+    UringEcho: An io_uring receiving and echoing the datagrams of one socket.
+
+Example:
+    if available:
+        ring = UringEcho(sock.fileno(), prefix=b"Echo: ")
+        loop.add_reader(ring.fileno(), ring.process, on_message)
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import mmap
+import os
+
+from _mmsg import SOCKADDR_SIZE, IOVec, MsgHdr, decode_address
+
+_SYS_IO_URING_SETUP = 425
+_SYS_IO_URING_ENTER = 426
+_SYS_IO_URING_REGISTER = 427
+
+IORING_SETUP_COOP_TASKRUN = 1 << 8
+IORING_SETUP_SINGLE_ISSUER = 1 << 12
+IORING_SETUP_DEFER_TASKRUN = 1 << 13
+IORING_FEAT_SINGLE_MMAP = 1 << 0
+IORING_ENTER_GETEVENTS = 1 << 0
+IORING_REGISTER_EVENTFD = 4
+IORING_REGISTER_NAPI = 27
+IORING_OP_SENDMSG = 9
+IORING_OP_RECVMSG = 10
+IORING_OFF_SQ_RING = 0
+IORING_OFF_CQ_RING = 0x8000000
+IORING_OFF_SQES = 0x10000000
+
+_RECV, _SEND = 0, 1
+
+
+class _SQRingOffsets(ctypes.Structure):
+    _fields_ = [
+        ("head", ctypes.c_uint32),
+        ("tail", ctypes.c_uint32),
+        ("ring_mask", ctypes.c_uint32),
+        ("ring_entries", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("dropped", ctypes.c_uint32),
+        ("array", ctypes.c_uint32),
+        ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _CQRingOffsets(ctypes.Structure):
+    _fields_ = [
+        ("head", ctypes.c_uint32),
+        ("tail", ctypes.c_uint32),
+        ("ring_mask", ctypes.c_uint32),
+        ("ring_entries", ctypes.c_uint32),
+        ("overflow", ctypes.c_uint32),
+        ("cqes", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _Params(ctypes.Structure):
+    _fields_ = [
+        ("sq_entries", ctypes.c_uint32),
+        ("cq_entries", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("sq_thread_cpu", ctypes.c_uint32),
+        ("sq_thread_idle", ctypes.c_uint32),
+        ("features", ctypes.c_uint32),
+        ("wq_fd", ctypes.c_uint32),
+        ("resv", ctypes.c_uint32 * 3),
+        ("sq_off", _SQRingOffsets),
+        ("cq_off", _CQRingOffsets),
+    ]
+
+
+class _Sqe(ctypes.Structure):
+    _fields_ = [
+        ("opcode", ctypes.c_uint8),
+        ("flags", ctypes.c_uint8),
+        ("ioprio", ctypes.c_uint16),
+        ("fd", ctypes.c_int32),
+        ("off", ctypes.c_uint64),
+        ("addr", ctypes.c_uint64),
+        ("len", ctypes.c_uint32),
+        ("msg_flags", ctypes.c_uint32),
+        ("user_data", ctypes.c_uint64),
+        ("buf_index", ctypes.c_uint16),
+        ("personality", ctypes.c_uint16),
+        ("splice_fd_in", ctypes.c_int32),
+        ("addr3", ctypes.c_uint64),
+        ("pad", ctypes.c_uint64),
+    ]
+
+
+class _Cqe(ctypes.Structure):
+    _fields_ = [
+        ("user_data", ctypes.c_uint64),
+        ("res", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+    ]
+
+
+class _Napi(ctypes.Structure):
+    _fields_ = [
+        ("busy_poll_to", ctypes.c_uint32),
+        ("prefer_busy_poll", ctypes.c_uint8),
+        ("pad", ctypes.c_uint8 * 3),
+        ("resv", ctypes.c_uint64),
+    ]
+
+
+def _load_libc():
+    """Return the libc handle used for the io_uring system calls, or None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        syscall = libc.syscall
+    except (OSError, AttributeError, TypeError):
+        return None
+    syscall.restype = ctypes.c_long
+    return libc
+
+
+_libc = _load_libc()
+available = _libc is not None and hasattr(os, "eventfd")
+
+
+def _check(result: int) -> int:
+    """Return ``result``, raising the errno it stands for when negative."""
+    if result < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    return result
+
+
+class UringEcho:
+    """An io_uring receiving and echoing the datagrams of one socket.
+
+    Every slot owns a receive buffer and a socket address. A slot alternates
+    between an outstanding RECVMSG and the SENDMSG echoing what it received,
+    the latter gathering the shared prefix and the payload in place.
+
+    The slot buffers stay pinned for the lifetime of the ring, so the default
+    of 8 slots keeps it to 512 KiB of 64 KiB buffers per socket.
+
+    Attributes:
+        fd (int): The file descriptor of the UDP socket.
+        size (int): The number of slots, i.e. of receives kept outstanding.
+        bufsize (int): The capacity of each receive buffer.
+    """
+
+    _BUSY_POLL_USEC = 50
+
+    def __init__(
+        self, fd: int, size: int = 8, bufsize: int = 65536, prefix: bytes = b""
+    ) -> None:
+        self.fd: int = fd
+        self.size: int = size
+        self.bufsize: int = bufsize
+        self._ring_fd: int = -1
+        self._event_fd: int = -1
+        self._maps: list = []
+        self._last_name: bytes = b""
+        self._last_address: tuple = None
+        self._prefix = ctypes.create_string_buffer(prefix, len(prefix))
+        self._buffers = (ctypes.c_char * (size * bufsize))()
+        self._names = (ctypes.c_char * (size * SOCKADDR_SIZE))()
+        self._view = memoryview(self._buffers).cast("B")
+        self._names_view = memoryview(self._names).cast("B")
+        self._rx_iov = (IOVec * size)()
+        self._tx_iov = (IOVec * (2 * size))()
+        self._rx = (MsgHdr * size)()
+        self._tx = (MsgHdr * size)()
+        self._setup_slots(len(prefix))
+        try:
+            self._setup_ring(2 * size)
+            for slot in range(size):
+                self._queue(slot, _RECV)
+            self._submit()
+        except OSError:
+            self.close()
+            raise
+
+    def fileno(self) -> int:
+        """Return the eventfd of the ring, readable when completions are pending."""
+        return self._event_fd
+
+    def process(self, on_message) -> None:
+        """Echo the completed receives and keep every slot receiving.
+
+        Args:
+            on_message (Callable[[tuple, memoryview], None]): Called with the
+                sender address and the payload of every received datagram,
+                before it is echoed.
+
+        Raises:
+            OSError: If a receive or an echo failed; the slot keeps receiving.
+        """
+        try:
+            os.eventfd_read(self._event_fd)
+        except BlockingIOError:
+            pass
+        self._enter(0, IORING_ENTER_GETEVENTS)
+        failure = 0
+        head = self._cq_head.value
+        tail = self._cq_tail.value
+        while head != tail:
+            cqe = self._cqes[head & self._cq_mask]
+            slot, operation, result = cqe.user_data >> 1, cqe.user_data & 1, cqe.res
+            head += 1
+            if operation == _RECV and result >= 0:
+                on_message(self._address(slot), self._payload(slot, result))
+                self._tx_iov[2 * slot + 1].iov_len = result
+                self._tx[slot].msg_namelen = self._rx[slot].msg_namelen
+                self._queue(slot, _SEND)
+                continue
+            if result < 0 and result != -errno.ECANCELED:
+                failure = failure or -result
+            self._queue(slot, _RECV)
+        self._cq_head.value = head & 0xFFFFFFFF
+        self._submit()
+        if failure:
+            raise OSError(failure, os.strerror(failure))
+
+    def close(self) -> None:
+        """Tear the ring down; outstanding operations are cancelled."""
+        for fd in (self._ring_fd, self._event_fd):
+            if fd >= 0:
+                os.close(fd)
+        self._ring_fd = self._event_fd = -1
+        for mapping in self._maps:
+            mapping.close()
+        self._maps = []
+
+    def _setup_slots(self, prefix_size: int) -> None:
+        """Point the slot message headers at their buffers and addresses."""
+        buffers = ctypes.addressof(self._buffers)
+        names = ctypes.addressof(self._names)
+        for i in range(self.size):
+            self._rx_iov[i].iov_base = buffers + i * self.bufsize
+            self._rx_iov[i].iov_len = self.bufsize
+            self._tx_iov[2 * i].iov_base = ctypes.addressof(self._prefix)
+            self._tx_iov[2 * i].iov_len = prefix_size
+            self._tx_iov[2 * i + 1].iov_base = self._rx_iov[i].iov_base
+            self._rx[i].msg_name = self._tx[i].msg_name = names + i * SOCKADDR_SIZE
+            self._rx[i].msg_iov = ctypes.pointer(self._rx_iov[i])
+            self._rx[i].msg_iovlen = 1
+            self._tx[i].msg_iov = ctypes.pointer(self._tx_iov[2 * i])
+            self._tx[i].msg_iovlen = 2
+
+    def _setup_ring(self, entries: int) -> None:
+        """Create the ring, map its queues, its eventfd and NAPI busy polling."""
+        params = _Params()
+        flags = (
+            IORING_SETUP_SINGLE_ISSUER
+            | IORING_SETUP_DEFER_TASKRUN
+            | IORING_SETUP_COOP_TASKRUN
+        )
+        for params.flags in (flags, 0):
+            result = _libc.syscall(_SYS_IO_URING_SETUP, entries, ctypes.byref(params))
+            if result >= 0 or ctypes.get_errno() != errno.EINVAL:
+                break
+        self._ring_fd = _check(result)
+        self._deferred = bool(params.flags & IORING_SETUP_DEFER_TASKRUN)
+
+        sq_off, cq_off = params.sq_off, params.cq_off
+        sq_size = sq_off.array + params.sq_entries * ctypes.sizeof(ctypes.c_uint32)
+        cq_size = cq_off.cqes + params.cq_entries * ctypes.sizeof(_Cqe)
+        if params.features & IORING_FEAT_SINGLE_MMAP:
+            sq_size = cq_size = max(sq_size, cq_size)
+            sq_ring = cq_ring = self._map(sq_size, IORING_OFF_SQ_RING)
+        else:
+            sq_ring = self._map(sq_size, IORING_OFF_SQ_RING)
+            cq_ring = self._map(cq_size, IORING_OFF_CQ_RING)
+        sqes = self._map(params.sq_entries * ctypes.sizeof(_Sqe), IORING_OFF_SQES)
+
+        self._sq_tail = ctypes.c_uint32.from_address(sq_ring + sq_off.tail)
+        self._sq_mask = ctypes.c_uint32.from_address(sq_ring + sq_off.ring_mask).value
+        self._sq_array = (ctypes.c_uint32 * params.sq_entries).from_address(
+            sq_ring + sq_off.array
+        )
+        self._sqes = (_Sqe * params.sq_entries).from_address(sqes)
+        self._cq_head = ctypes.c_uint32.from_address(cq_ring + cq_off.head)
+        self._cq_tail = ctypes.c_uint32.from_address(cq_ring + cq_off.tail)
+        self._cq_mask = ctypes.c_uint32.from_address(cq_ring + cq_off.ring_mask).value
+        self._cqes = (_Cqe * params.cq_entries).from_address(cq_ring + cq_off.cqes)
+        self._pending = 0
+
+        self._event_fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        event_fd = ctypes.c_int(self._event_fd)
+        _check(
+            _libc.syscall(
+                _SYS_IO_URING_REGISTER,
+                self._ring_fd,
+                IORING_REGISTER_EVENTFD,
+                ctypes.byref(event_fd),
+                1,
+            )
+        )
+        napi = _Napi(busy_poll_to=self._BUSY_POLL_USEC, prefer_busy_poll=1)
+        _libc.syscall(
+            _SYS_IO_URING_REGISTER,
+            self._ring_fd,
+            IORING_REGISTER_NAPI,
+            ctypes.byref(napi),
+            1,
+        )
+
+    def _map(self, length: int, offset: int) -> int:
+        """Map a ring region shared with the kernel and return its address."""
+        mapping = mmap.mmap(
+            self._ring_fd,
+            length,
+            flags=mmap.MAP_SHARED | getattr(mmap, "MAP_POPULATE", 0),
+            prot=mmap.PROT_READ | mmap.PROT_WRITE,
+            offset=offset,
+        )
+        self._maps.append(mapping)
+        anchor = ctypes.c_char.from_buffer(mapping)
+        address = ctypes.addressof(anchor)
+        del anchor
+        return address
+
+    def _queue(self, slot: int, operation: int) -> None:
+        """Fill the next submission entry with a receive or an echo for ``slot``."""
+        tail = self._sq_tail.value
+        index = tail & self._sq_mask
+        sqe = self._sqes[index]
+        ctypes.memset(ctypes.addressof(sqe), 0, ctypes.sizeof(_Sqe))
+        if operation == _RECV:
+            self._rx[slot].msg_namelen = SOCKADDR_SIZE
+            sqe.opcode = IORING_OP_RECVMSG
+            sqe.addr = ctypes.addressof(self._rx[slot])
+        else:
+            sqe.opcode = IORING_OP_SENDMSG
+            sqe.addr = ctypes.addressof(self._tx[slot])
+        sqe.fd = self.fd
+        sqe.len = 1
+        sqe.user_data = slot << 1 | operation
+        self._sq_array[index] = index
+        self._sq_tail.value = (tail + 1) & 0xFFFFFFFF
+        self._pending += 1
+
+    def _submit(self) -> None:
+        """Hand the queued submission entries over to the kernel."""
+        if self._pending:
+            self._enter(self._pending, 0)
+            self._pending = 0
+
+    def _enter(self, to_submit: int, flags: int) -> None:
+        """Call io_uring_enter, retrying when interrupted by a signal."""
+        if not to_submit and not self._deferred:
+            return
+        while True:
+            result = _libc.syscall(
+                _SYS_IO_URING_ENTER, self._ring_fd, to_submit, 0, flags, None, 0
+            )
+            if result >= 0 or ctypes.get_errno() != errno.EINTR:
+                _check(result)
+                return
+
+    def _payload(self, slot: int, size: int) -> memoryview:
+        """Return a view on the ``size`` bytes received by ``slot``."""
+        start = slot * self.bufsize
+        return self._view[start : start + size]
+
+    def _address(self, slot: int) -> tuple:
+        """Return the sender address of the datagram received by ``slot``."""
+        start = slot * SOCKADDR_SIZE
+        name = self._names_view[start : start + self._rx[slot].msg_namelen]
+        if name != self._last_name:
+            self._last_name = name.tobytes()
+            self._last_address = decode_address(name)
+        return self._last_address
@@ -14,127 +14,148 @@ Example:
     client.run("localhost", 12345)
 """
 
+import asyncio
 import socket
-import threading
 import sys
 from typing import Tuple
 
+import _console
+import _msglog
+
+_QUIT = frozenset({b"quit", b"q"})
+
 
 class Client:
     """UDP client class for sending and receiving messages from a server.
 
     This class implements a UDP client that can send messages to a server
-    and receive responses. It operates asynchronously, allowing for concurrent
-    sending and receiving of messages.
+    and receive responses. It operates asynchronously on a single asyncio
+    event loop, allowing for concurrent sending and receiving of messages.
 
     Attributes:
         running (bool): Flag indicating whether the client is running.
         client_socket (socket.socket): The client's socket for communication.
-        receiver_thread (threading.Thread): The thread for receiving messages from the server.
-        sender_thread (threading.Thread): The thread for sending messages to the server.
+        server_address (Tuple[str, int]): The numeric address of the server,
+            resolved once when the client starts.
 
     Methods:
         receive_message: Receives messages from the server and prints them to the console.
         send_message: Allows the user to input messages and sends them to the server.
-        run: Initializes the client, establishes connection with the server, and starts sender
-            and receiver threads.
+        run: Initializes the client, establishes connection with the server, and runs
+            the event loop until the user quits.
         stop: Stops the client and performs cleanup.
 
     """
 
+    _PROMPT = "Type message to server ('quit' or 'q' to stop): \n"
+
     def __init__(self) -> None:
         self.running: bool = True
         self.client_socket: socket.socket = None
-        self.receiver_thread: threading.Thread = None
-        self.sender_thread: threading.Thread = None
         self.server_address: Tuple[str, int] = ()
+        self._rx_buf: bytearray = bytearray(65536)
+        self._rx_mv: memoryview = memoryview(self._rx_buf)
+        self._loop: asyncio.AbstractEventLoop = None
+        self._stopped: asyncio.Event = None
+        self._log: _msglog.MessageLog = _msglog.MessageLog(
+            "Received message from server: {message}\n"
+        )
 
     def receive_message(self) -> None:
         """Receive messages from the server.
-        Listens for incoming messages from the
-        server and prints them to the console.
+        Called by the event loop whenever the socket is readable, drains the
+        pending datagrams into the preallocated receive buffer and queues them
+        on the message log, which prints them to the console in batches. The
+        socket is connected to the server, so no sender address is returned.
         """
         while self.running:
             try:
-                message, _ = self.client_socket.recvfrom(1024)
-                print(f"Received message from server: {message.decode()}")
+                size = self.client_socket.recv_into(self._rx_mv)
+            except (BlockingIOError, InterruptedError):
+                return
             except socket.error as socket_error:
-                if socket.timeout:
-                    pass
-                else:
-                    print(f"Socket error in receive_message: {socket_error}")
-            except Exception as general_error:
-                print(f"Failed to receive the message: {general_error}")
-
-    def send_message(self) -> None:
-        """Send messages to the server.
-
-        Allows the user to input messages and sends them to the server.
-        The method continues running until the user types 'quit' or 'q'.
+                print(f"Socket error in receive_message: {socket_error}")
+                return
+            self._log.append(self.server_address, self._rx_mv[:size].tobytes())
+
+    def send_message(self, message: bytes) -> None:
+        """Send a message to the server.
+
+        Called by the console reader for every line typed by the user, sends
+        it to the server and prompts for the next one. The client stops when
+        the user types 'quit' or 'q'.
+
+        Args:
+            message (bytes): The line typed by the user.
         """
+        if not self.running:
+            return
+        if message.strip().lower() in _QUIT:
+            self.stop()
+            return
         try:
-            while self.running:
-                message = input("Type message to server ('quit' or 'q' to stop): \n")
-                if message.lower() in ["quit", "q"]:
-                    self.stop()
-                    sys.exit(0)
-                self.client_socket.sendto(message.encode(), self.server_address)
+            self.client_socket.send(message)
         except socket.error as socket_error:
             print(f"Socket error in send_message: {socket_error}")
         except Exception as general_error:
             print(f"Failed to send message: {general_error}")
+        print(self._PROMPT, end="", flush=True)
+
+    async def _run(self, host: str, port: int) -> None:
+        """Connect the socket, watch it and stdin until the client stops."""
+        loop = asyncio.get_running_loop()
+        self.server_address = socket.getaddrinfo(
+            host, port, socket.AF_INET, socket.SOCK_DGRAM
+        )[0][4]
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.client_socket.setblocking(False)
+            self.client_socket.connect(self.server_address)
+            self._loop = loop
+            self._stopped = asyncio.Event()
+            console = _console.ConsoleReader(self.send_message, self.stop)
+            loop.add_reader(self.client_socket, self.receive_message)
+            console.start(loop)
+            print(self._PROMPT, end="", flush=True)
+            try:
+                await self._stopped.wait()
+            finally:
+                console.stop()
+                loop.remove_reader(self.client_socket)
+                self._log.flush()
+        finally:
+            self.client_socket.close()
 
     def run(self, host: str, port: int) -> None:
         """Run the client.
 
         Initializes the client, establishes a connection with the server
-        located at the specified host and port, and starts the sender
-        and receiver threads to manage message sending and receiving
-        asynchronously.
+        located at the specified host and port, and runs the event loop
+        which receives the server messages and sends the user input.
 
         Args:
             host (str): The hostname or IP address of the server.
             port (int): The port number on which the server is listening.
         """
         try:
-            self.server_address = (host, port)
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.client_socket.settimeout(1)
-            self.receiver_thread = threading.Thread(target=self.receive_message)
-            self.sender_thread = threading.Thread(target=self.send_message)
-
-            self.receiver_thread.start()
-            self.sender_thread.start()
-
-            self.receiver_thread.join()
-            self.sender_thread.join()
+            asyncio.run(self._run(host, port))
         except socket.error as socket_error:
             print(f"Socket error in run_server: {socket_error}")
         except Exception as general_error:
             print(f"failed to run the client properly: {general_error}")
-        finally:
-            if self.client_socket:
-                self.client_socket.close()
 
     def stop(self) -> None:
         """Stop the client.
-        Sets the running flag to False to signal the receiver and sender threads
-        to stop, joins the threads to wait for their completion, closes the client
-        socket, and prints a message indicating that the client has stopped.
+        Sets the running flag to False and wakes the event loop through its
+        self-pipe so that it may be called from any thread; the socket is
+        closed once the event loop unwinds.
         """
+        if not self.running:
+            return
         print("Stopping the client...")
         self.running = False
-        try:
-            if threading.current_thread() != self.receiver_thread:
-                self.receiver_thread.join()
-            if threading.current_thread() != self.sender_thread:
-                self.sender_thread.join()
-            if self.client_socket:
-                self.client_socket.close()
-        except socket.error as socket_error:
-            print(f"failed to close the socket: {socket_error}")
-        except Exception as general_exception:
-            print(f"failed to stop the client gracefully: {general_exception}")
+        if self._stopped is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stopped.set)
         print("Client stopped.")
 
 
@@ -23,159 +23,431 @@ Example:
     server.run_server("localhost", 12345)
 """
 
+import asyncio
+import os
+import select
 import socket
-import threading
 import sys
-import time
+import threading
+from typing import List, Tuple
+
+import _console
+import _mmsg
+import _msglog
+import _uring
+
+try:
+    import _echo
+except ImportError:
+    _echo = None
+
+
+# Linux socket options missing from older socket modules.
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+SO_INCOMING_CPU = getattr(socket, "SO_INCOMING_CPU", 49)
+
+_QUIT = frozenset({b"quit", b"q"})
 
 
 class UDPServer:
     """UDP server class for receiving and responding to messages from clients.
     This class provides functionality for creating and managing a UDP server
     that can receive messages from clients, send responses, and allow interaction
-    with connected clients. The server operates in a non-blocking manner,
-    allowing it to handle multiple clients concurrently.
+    with connected clients. The server runs on a single asyncio event loop,
+    allowing it to handle multiple clients concurrently. With the native echo
+    path, extra worker sockets can be bound to the server address with
+    SO_REUSEPORT, each drained by a thread of its own, so that the kernel
+    spreads the client flows over several receive queues and CPUs.
 
     Attributes:
         last_client_address (tuple): The address of the last connected client.
-        lock (threading.Lock): A lock for thread synchronization.
         server_socket (socket.socket): The server's socket for communication.
-        receiver_thread (threading.Thread): The thread for receiving messages.
-        user_thread (threading.Thread): The thread for sending user messages to the last client.
+        server_sockets (List[socket.socket]): All the sockets bound to the server address.
         running (bool): Flag indicating whether the server is running.
 
     Methods:
         receive_messages_from_clients: Receives messages from clients and responds to them.
-        send_response_to_client: Sends response to the client and echoing the client message.
         send_user_message_to_last_client: Sends user input messages to the last connected client.
         run_server: Starts the server, listens for incoming messages, and handles client connections.
         stop_server: Stops the server and performs cleanup.
     """
 
+    _ECHO_PREFIX = b"Echo: "
+    _USER_MESSAGE_PREFIX = b"Server user message: "
+    _PROMPT = "message to the last client ( 'quit' or 'q' to stop): "
+    _BUSY_POLL_USEC = 50
+    _ZEROCOPY_THRESHOLD = 10 * 1024
+
     def __init__(self) -> None:
         """Initialize the server."""
         self.last_client_address: tuple = None
-        self.lock: threading.Lock = threading.Lock()
         self.server_socket: socket.socket = None
-        self.receiver_thread: threading.Thread = None
-        self.user_thread: threading.Thread = None
+        self.server_sockets: List[socket.socket] = []
         self.running: bool = False
+        self._rx_buf: bytearray = bytearray(65536)
+        self._rx_mv: memoryview = memoryview(self._rx_buf)
+        self._batch: _mmsg.DatagramBatch = None
+        self._last_name: bytearray = None
+        self._zerocopy: bool = False
+        self._rings: List[_uring.UringEcho] = []
+        self._workers: List[threading.Thread] = []
+        self._wakeup: Tuple[int, int] = None
+        self._cpus: List[int] = []
+        self._loop: asyncio.AbstractEventLoop = None
+        self._stopped: asyncio.Event = None
+        self._log: _msglog.MessageLog = _msglog.MessageLog(
+            "\nReceived message from {address}: {message}\n"
+        )
+
+    def receive_messages_from_clients(self, server_socket: socket.socket) -> None:
+        """Receive messages from clients and respond to them.
 
-    def receive_messages_from_clients(self) -> None:
-        """Receive messages from clients and respond to them."""
+        Called by the event loop whenever a server socket is readable, drains the
+        pending datagrams into the preallocated receive buffer and queues them
+        on the message log, which prints them in batches. When recvmmsg
+        is available the datagrams are drained and echoed a burst at a time.
+        Otherwise each one is gather-sent back behind the echo prefix, with the
+        socket and log methods bound once per drain instead of once per datagram.
+
+        Args:
+            server_socket (socket.socket): The readable server socket.
+        """
+        if self._last_name is not None:
+            self._echo_natively(server_socket, self._last_name)
+            return
+        if self._batch is not None:
+            self._receive_batches_from_clients(server_socket)
+            return
+        rx_mv = self._rx_mv
+        recvfrom_into = server_socket.recvfrom_into
+        sendmsg = server_socket.sendmsg
+        log = self._log.append
+        prefix = self._ECHO_PREFIX
         while self.running:
             try:
-                message, client_address = self.server_socket.recvfrom(1024)
-                print(f"\nReceived message from {client_address}: {message.decode()}")
-                sys.stdout.flush()
-                with self.lock:
-                    self.last_client_address = client_address
-                self.send_response_to_client(message, client_address)
-
-            except socket.timeout:
-                pass
+                size, client_address = recvfrom_into(rx_mv)
+            except (BlockingIOError, InterruptedError):
+                return
             except socket.error as socket_error:
                 print(f"Socket error: {socket_error}")
-            except Exception as general_error:
-                print(f"Failed to recieve message: {general_error}")
+                return
+            message = rx_mv[:size]
+            log(client_address, message.tobytes())
+            self.last_client_address = client_address
+            try:
+                sendmsg([prefix, message], (), 0, client_address)
+            except socket.error as socket_error:
+                print(f"Socket error in receive_messages_from_clients: {socket_error}")
 
-    def send_response_to_client(self, message: str, client_address: tuple) -> None:
-        """Send response to the client and echoing the client message.
-        Args:
-           message (str): The message to send to the client.
-           client_address (tuple): The address of the client.
+    def _echo_natively(
+        self, server_socket: socket.socket, last_name: bytearray
+    ) -> None:
+        """Drain and echo the socket from the native extension, without logging.
+
+        The extension stores the last sender in ``last_name`` even when it then
+        raises for a failed reply, so the address is read back either way.
         """
+        last_name[0] = 0
         try:
-            self.server_socket.sendto(
-                f"Echo: {message.decode()}".encode(), client_address
+            _echo.echo_pending(server_socket.fileno(), last_name)
+        except socket.error as socket_error:
+            print(f"Socket error: {socket_error}")
+        finally:
+            if last_name[0]:
+                name = memoryview(last_name)[1 : 1 + last_name[0]]
+                self.last_client_address = _mmsg.decode_address(name)
+
+    def _echo_worker(
+        self, server_socket: socket.socket, wakeup_fd: int, cpu: int
+    ) -> None:
+        """Echo the datagrams of a worker socket natively until the server stops.
+
+        The thread sleeps in poll and the extension echoes without the GIL, so
+        the worker sockets are served in parallel with the event loop. When
+        ``cpu`` is given, the thread is pinned to the CPU SO_INCOMING_CPU steers
+        the socket wakeups to.
+        """
+        if cpu is not None:
+            os.sched_setaffinity(0, {cpu})
+        last_name = bytearray(129)
+        poller = select.poll()
+        poller.register(server_socket, select.POLLIN)
+        poller.register(wakeup_fd, select.POLLIN)
+        while self.running:
+            events = poller.poll()
+            if any(fd == wakeup_fd for fd, _ in events):
+                return
+            self._echo_natively(server_socket, last_name)
+
+    def _start_workers(self) -> None:
+        """Drain every server socket but the first from a thread of its own."""
+        self._wakeup = os.pipe()
+        for index, server_socket in enumerate(self.server_sockets[1:], 1):
+            cpu = self._cpus[index % len(self._cpus)] if self._cpus else None
+            worker = threading.Thread(
+                target=self._echo_worker,
+                args=(server_socket, self._wakeup[0], cpu),
+                daemon=True,
             )
+            worker.start()
+            self._workers.append(worker)
+
+    def _stop_workers(self) -> None:
+        """Wake the worker threads up and wait for them to return."""
+        if self._wakeup is None:
+            return
+        os.write(self._wakeup[1], b"\0")
+        for worker in self._workers:
+            worker.join()
+        for fd in self._wakeup:
+            os.close(fd)
+        self._workers, self._wakeup = [], None
+
+    def _process_ring(self, ring: _uring.UringEcho) -> None:
+        """Log the datagrams an io_uring echoed since the last readable event."""
+        try:
+            ring.process(self._on_ring_message)
         except socket.error as socket_error:
-            print(f"Socket error in send_response_to_client: {socket_error}")
-        except Exception as general_error:
-            print(f"Failed to respond to the client message: {general_error}")
+            print(f"Socket error: {socket_error}")
 
-    def send_user_message_to_last_client(self) -> None:
-        """Send user input messages to the last connected client.
+    def _on_ring_message(self, client_address: tuple, message: memoryview) -> None:
+        """Queue a datagram received by an io_uring before it is echoed."""
+        self._log.append(client_address, message.tobytes())
+        self.last_client_address = client_address
 
-        This method continuously prompts the user for input messages and sends
-        them to the last connected client. It terminates when the user inputs
-        'q' or 'quit'.
+    def _receive_batches_from_clients(self, server_socket: socket.socket) -> None:
+        """Drain the socket a burst at a time, echoing each burst in one system call.
 
+        Bursts averaging at least _ZEROCOPY_THRESHOLD bytes per datagram are
+        echoed with MSG_ZEROCOPY; below that, pinning the pages and reaping the
+        completions costs more than the copy it saves.
         """
+        fd = server_socket.fileno()
         while self.running:
-            if self.last_client_address is not None:
-                message = input("message to the last client ( 'quit' or 'q' to stop): ")
-                sys.stdout.flush()
-                if message.lower() in ["quit", "q"]:
-                    server.stop_server()
-                    sys.exit(0)
-                try:
-                    self.server_socket.sendto(
-                        f"Server user message: {message}".encode(),
-                        self.last_client_address,
-                    )
-                except socket.error as socket_error:
-                    print(
-                        f"Socket error in send_user_message_to_last_client: {socket_error}"
-                    )
-                except Exception as general_error:
-                    print(
-                        f"Failed to send message to the last known client: {general_error}"
-                    )
-
-    def run_server(self, host: str, port: int) -> None:
-        """Starts the server, listens for incoming messages, and handles clients connections.
+            try:
+                count = self._batch.receive(fd)
+            except socket.error as socket_error:
+                print(f"Socket error: {socket_error}")
+                return
+            received = 0
+            for index in range(count):
+                client_address = self._batch.address(index)
+                payload = self._batch.payload(index)
+                received += len(payload)
+                self._log.append(client_address, payload.tobytes())
+            if count:
+                self.last_client_address = client_address
+            zerocopy = self._zerocopy and received >= count * self._ZEROCOPY_THRESHOLD
+            try:
+                self._batch.echo(fd, count, zerocopy)
+            except socket.error as socket_error:
+                print(f"Socket error in _receive_batches_from_clients: {socket_error}")
+            if count < self._batch.size:
+                if self._zerocopy:
+                    self._batch.reap(server_socket)
+                return
+
+    def send_user_message_to_last_client(self, message: bytes) -> None:
+        """Send a user input message to the last connected client.
+
+        Called by the console reader for every line typed by the user, then
+        prompts for the next one. The server stops when the user inputs
+        'q' or 'quit'.
 
         Args:
-            host (str): The server's host address.
-            port (int): The port number for listening.
+            message (bytes): The line typed by the user.
         """
+        if not self.running:
+            return
+        if message.strip().lower() in _QUIT:
+            self.stop_server()
+            return
+        if self.last_client_address is None:
+            print("No client has sent a message yet.")
+        else:
+            try:
+                self.server_socket.sendmsg(
+                    [self._USER_MESSAGE_PREFIX, message],
+                    [],
+                    0,
+                    self.last_client_address,
+                )
+            except socket.error as socket_error:
+                print(
+                    f"Socket error in send_user_message_to_last_client: {socket_error}"
+                )
+            except Exception as general_error:
+                print(
+                    f"Failed to send message to the last known client: {general_error}"
+                )
+        print(self._PROMPT, end="", flush=True)
+
+    def _bind_sockets(self, host: str, port: int, workers: int) -> None:
+        """Bind one non-blocking socket per worker to the resolved server address.
+
+        SO_REUSEPORT is only set for several workers. It lets any other process
+        of the same user bind the address too and take a share of the flows,
+        while a single socket makes a second server instance fail to bind.
+        """
+        if not hasattr(socket, "SO_REUSEPORT"):
+            workers = 1
+        # An empty host binds all interfaces, as bind(("", port)) does.
+        addresses = socket.getaddrinfo(
+            host or None, port, socket.AF_INET, socket.SOCK_DGRAM, 0, socket.AI_PASSIVE
+        )
+        address = addresses[0][4]
+        for _ in range(workers):
+            server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.server_sockets.append(server_socket)
+            server_socket.setblocking(False)
+            if workers > 1:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            server_socket.bind(address)
+        if sys.platform.startswith("linux"):
+            # The first socket is drained by the event loop thread, which is
+            # not pinned, so only the worker sockets are tied to a CPU.
+            self._cpus = sorted(os.sched_getaffinity(0))
+            for index, server_socket in enumerate(self.server_sockets):
+                cpu = self._cpus[index % len(self._cpus)] if index else None
+                self._tune_socket(server_socket, cpu)
+        self.server_socket = self.server_sockets[0]
+
+    def _tune_socket(self, server_socket: socket.socket, cpu: int = None) -> None:
+        """Enable busy polling and steer the socket wakeups to ``cpu``, if given.
+
+        SO_BUSY_POLL lets a receive poll the device queue for a few microseconds
+        before sleeping; raising it above the net.core.busy_read sysctl needs
+        CAP_NET_ADMIN, and the epoll wait of the event loop only busy polls when
+        the net.core.busy_poll sysctl is set. SO_INCOMING_CPU makes the kernel
+        prefer, among the SO_REUSEPORT sockets, the one tied to the CPU that
+        handled the packet; the worker thread draining the socket is pinned to
+        that CPU. Both options are best effort.
+        """
+        options = [(SO_BUSY_POLL, self._BUSY_POLL_USEC)]
+        if cpu is not None:
+            options.append((SO_INCOMING_CPU, cpu))
+        for option, value in options:
+            try:
+                server_socket.setsockopt(socket.SOL_SOCKET, option, value)
+            except OSError:
+                pass
+
+    def _setup_rings(self) -> bool:
+        """Create one io_uring per server socket, or none if one cannot be set up."""
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.server_socket.bind((host, port))
-            self.server_socket.settimeout(1)
-            self.running = True
+            for server_socket in self.server_sockets:
+                self._rings.append(
+                    _uring.UringEcho(server_socket.fileno(), prefix=self._ECHO_PREFIX)
+                )
+        except OSError as os_error:
+            print(f"io_uring is not usable ({os_error}), using the socket echo path.")
+            self._close_rings()
+        return bool(self._rings)
 
-            print(f"Server listening on {host}:{port}")
+    def _close_rings(self) -> None:
+        """Close the io_uring instances, cancelling their pending operations."""
+        for ring in self._rings:
+            ring.close()
+        self._rings = []
 
-            self.receiver_thread = threading.Thread(
-                target=self.receive_messages_from_clients
+    async def _serve(
+        self, host: str, port: int, workers: int, native_echo: bool, io_uring: bool
+    ) -> None:
+        """Bind the sockets, watch them for messages and serve the user prompt."""
+        loop = asyncio.get_running_loop()
+        if workers > 1 and (not native_echo or _echo is None):
+            print("Worker sockets need the _echo extension, serving from one socket.")
+            workers = 1
+        self._bind_sockets(host, port, workers)
+        if native_echo and _echo is None:
+            print("The _echo extension is not built, using the Python echo path.")
+        elif native_echo:
+            self._last_name = bytearray(129)
+        elif io_uring and _uring.available and self._setup_rings():
+            print("Echoing the client messages through io_uring.")
+        elif _mmsg.available:
+            self._batch = _mmsg.DatagramBatch(prefix=self._ECHO_PREFIX)
+            self._zerocopy = all(
+                [_mmsg.enable_zerocopy(sock) for sock in self.server_sockets]
             )
-            self.receiver_thread.start()
+        self.running = True
+        if len(self.server_sockets) > 1:
+            self._start_workers()
 
-            self.user_thread = threading.Thread(
-                target=self.send_user_message_to_last_client
+        print(f"Server listening on {host}:{port}")
+
+        for ring in self._rings:
+            loop.add_reader(ring.fileno(), self._process_ring, ring)
+        if not self._rings:
+            server_socket = self.server_socket
+            loop.add_reader(
+                server_socket, self.receive_messages_from_clients, server_socket
             )
-            self.user_thread.start()
+        self._loop = loop
+        self._stopped = asyncio.Event()
+        # Without a console (stdin at end of file, as under nohup or systemd)
+        # the server keeps serving; only 'quit' or a signal stops it.
+        console = _console.ConsoleReader(self.send_user_message_to_last_client)
+        console.start(loop)
+        print(self._PROMPT, end="", flush=True)
+        try:
+            await self._stopped.wait()
+        finally:
+            console.stop()
+            for ring in self._rings:
+                loop.remove_reader(ring.fileno())
+            if not self._rings:
+                loop.remove_reader(self.server_socket)
+            self._close_rings()
+            self._log.flush()
+            self.stop_server()
 
-            # Wait for KeyboardInterrupt to stop the server
-            while self.running:
-                time.sleep(1)
+    def run_server(
+        self,
+        host: str,
+        port: int,
+        workers: int = 1,
+        native_echo: bool = False,
+        io_uring: bool = False,
+    ) -> None:
+        """Starts the server, listens for incoming messages, and handles clients connections.
 
+        Args:
+            host (str): The server's host address.
+            port (int): The port number for listening.
+            workers (int): The number of sockets bound to the address with
+                SO_REUSEPORT, each drained by a thread of its own; more than
+                one needs the native echo path.
+            native_echo (bool): Echo the client messages from the _echo
+                extension, without printing them, when it is built.
+            io_uring (bool): Receive and echo the client messages through one
+                io_uring per socket, when the kernel supports it.
+        """
+        try:
+            asyncio.run(self._serve(host, port, workers, native_echo, io_uring))
         except socket.error as socket_error:
             print(f"Socket error in run_server: {socket_error}")
-            self.stop_server()
         except Exception as general_error:
             print(f"Failed to run the server properly: {general_error}")
-            self.stop_server()
         finally:
             self.stop_server()
 
     def stop_server(self) -> None:
         """Stop the server and perform cleanup.
 
-        This method stops the server and performs necessary cleanup tasks, including closing the
-        server socket and joining the receiver and user threads."""
+        This method stops the server and performs necessary cleanup tasks,
+        including closing the server sockets. It may be called from any thread:
+        the event loop is woken through its self-pipe, so the server does not
+        wait for a timeout to shut down."""
         if self.running:
             print("Server stopping...")
             self.running = False
             try:
-                if threading.current_thread() != self.receiver_thread:
-                    self.receiver_thread.join()
-                if threading.current_thread() != self.user_thread:
-                    self.user_thread.join()
-                if self.server_socket:
-                    self.server_socket.close()
+                self._stop_workers()
+                for server_socket in self.server_sockets:
+                    server_socket.close()
+                if self._stopped is not None and not self._loop.is_closed():
+                    self._loop.call_soon_threadsafe(self._stopped.set)
                 print("Server stopped.")
             except socket.error as socket_error:
                 print(f"failed to close the socket: {socket_error}")
@@ -8,7 +8,6 @@ These tests are placeholders and will be implemented in the future.
 
 Tests:
     - test_receive_messages_from_clients: Placeholder test for the receive_messages_from_clients method.
-    - test_send_response_to_client: Placeholder test for the send_response_to_client method.
     - test_send_user_message_to_last_client: Placeholder test for the send_user_message_to_last_client method.
     - test_run_server: Placeholder test for the run_server method.
     - test_stop_server: Placeholder test for the stop_server method.
@@ -25,10 +24,6 @@ class TestUDPServer(TestCase):
         """Placeholder test for the receive_messages_from_clients method."""
         pass
 
-    def test_send_response_to_client(self):
-        """Placeholder test for the send_response_to_client method."""
-        pass
-
     def test_send_user_message_to_last_client(self):
         """Placeholder test for the send_user_message_to_last_client method."""
         pass
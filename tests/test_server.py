@@ -2,20 +2,60 @@
 
 This module provides unit tests for the UDP server module.
 The tests cover the functionality of the server class methods
-including message receiving, sending, server running, and stopping.
+including message receiving, sending, server running, and stopping, and
+the batched datagram I/O of the _mmsg and _uring modules over loopback
+sockets, the batched console output of the _msglog module and the console
+input of the _console module.
 
-These tests are placeholders and will be implemented in the future.
+The UDPServer tests are placeholders and will be implemented in the future.
 
 Tests:
     - test_receive_messages_from_clients: Placeholder test for the receive_messages_from_clients method.
-    - test_send_response_to_client: Placeholder test for the send_response_to_client method.
     - test_send_user_message_to_last_client: Placeholder test for the send_user_message_to_last_client method.
     - test_run_server: Placeholder test for the run_server method.
     - test_stop_server: Placeholder test for the stop_server method.
+    - test_bind_all_interfaces: An empty host binds every interface.
+    - test_receive_and_echo_burst: A burst is received and echoed in one call each.
+    - test_echo_burst_past_failed_reply: A reply too long for UDP is skipped.
+    - test_receive_largest_datagram: A 64 KiB datagram is received untruncated.
+    - test_address_cache: A burst from one client decodes its address once.
+    - test_receive_nothing_pending: An empty socket queue yields no datagram.
+    - test_zerocopy_echo_burst: Lent buffers echo intact and are recycled by reap.
+    - test_echo_messages: Short, large and empty datagrams are echoed by io_uring.
+    - test_echo_long_burst: A burst much longer than the ring is echoed in full.
+    - test_flush_full_batch: A full batch is written at once.
+    - test_flush_after_delay: A partial batch is written once the delay expired.
+    - test_sender_header_per_run: The sender header is formatted once per run.
+    - test_undecodable_payload: Payloads are written as received.
+    - test_line_split_across_reads: A line read in two parts is dispatched once.
+    - test_lines_in_one_read: Every line of a single read is dispatched.
+    - test_last_line_at_eof: An unterminated last line is dispatched at EOF.
+    - test_eof_callback: on_eof is called once and reading stops.
+    - test_regular_file: A regular file is read from loop callbacks.
 
 """
 
-from unittest import TestCase, main as unittest_main
+import asyncio
+import errno
+import os
+import select
+import socket
+import sys
+import tempfile
+import time
+from unittest import (
+    IsolatedAsyncioTestCase,
+    TestCase,
+    main as unittest_main,
+    skipUnless,
+)
+from unittest.mock import patch
+
+import _console
+import _mmsg
+import _msglog
+import _uring
+from server import UDPServer
 
 
 class TestUDPServer(TestCase):
@@ -25,10 +65,6 @@ class TestUDPServer(TestCase):
         """Placeholder test for the receive_messages_from_clients method."""
         pass
 
-    def test_send_response_to_client(self):
-        """Placeholder test for the send_response_to_client method."""
-        pass
-
     def test_send_user_message_to_last_client(self):
         """Placeholder test for the send_user_message_to_last_client method."""
         pass
@@ -41,6 +77,346 @@ class TestUDPServer(TestCase):
         """Placeholder test for the stop_server method."""
         pass
 
+    def test_bind_all_interfaces(self):
+        """An empty host binds every interface, as bind(("", port)) does."""
+        server = UDPServer()
+        server._bind_sockets("", 0, 1)
+        self.addCleanup(server.server_socket.close)
+        self.assertEqual(server.server_socket.getsockname()[0], "0.0.0.0")
+
+
+@skipUnless(_mmsg.available, "recvmmsg and sendmmsg are not available")
+class TestDatagramBatch(TestCase):
+    """Test cases for the recvmmsg and sendmmsg wrappers of the _mmsg module."""
+
+    PREFIX = b"Echo: "
+
+    def setUp(self):
+        """Open a non-blocking server socket and a client socket on loopback."""
+        self.server_socket = self.udp_socket()
+        self.server_socket.setblocking(False)
+        self.client_socket = self.udp_socket()
+        self.client_socket.settimeout(1)
+        self.address = self.server_socket.getsockname()
+        self.batch = _mmsg.DatagramBatch(size=8, prefix=self.PREFIX)
+
+    def tearDown(self):
+        """Close the sockets."""
+        self.server_socket.close()
+        self.client_socket.close()
+
+    def udp_socket(self) -> socket.socket:
+        """Return a UDP socket bound to an ephemeral loopback port."""
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.bind(("127.0.0.1", 0))
+        return udp_socket
+
+    def test_receive_and_echo_burst(self):
+        """A burst is received and echoed in one call each."""
+        messages = [b"message %d" % i for i in range(5)]
+        for message in messages:
+            self.client_socket.sendto(message, self.address)
+        fd = self.server_socket.fileno()
+        count = self.batch.receive(fd)
+        self.assertEqual(count, len(messages))
+        payloads = [self.batch.payload(i).tobytes() for i in range(count)]
+        self.assertEqual(payloads, messages)
+        self.assertEqual(self.batch.echo(fd, count), count)
+        for message in messages:
+            self.assertEqual(self.client_socket.recv(1024), self.PREFIX + message)
+
+    def test_echo_burst_past_failed_reply(self):
+        """A reply too long for UDP is skipped, the rest of the burst is sent."""
+        messages = [b"a", b"x" * 65507, b"b", b"c"]
+        for message in messages:
+            self.client_socket.sendto(message, self.address)
+        fd = self.server_socket.fileno()
+        count = self.batch.receive(fd)
+        self.assertEqual(count, len(messages))
+        with self.assertRaises(OSError) as raised:
+            self.batch.echo(fd, count)
+        self.assertEqual(raised.exception.errno, errno.EMSGSIZE)
+        for message in (b"a", b"b", b"c"):
+            self.assertEqual(self.client_socket.recv(1024), self.PREFIX + message)
+
+    def test_receive_largest_datagram(self):
+        """A 64 KiB datagram is received untruncated."""
+        message = bytes(range(256)) * 255 + bytes(range(227))
+        self.assertEqual(len(message), 65507)
+        self.client_socket.sendto(message, self.address)
+        self.assertEqual(self.batch.receive(self.server_socket.fileno()), 1)
+        self.assertEqual(self.batch.payload(0).tobytes(), message)
+
+    def test_address_cache(self):
+        """A burst from one client decodes its address once."""
+        other_socket = self.udp_socket()
+        self.addCleanup(other_socket.close)
+        self.client_socket.sendto(b"first", self.address)
+        self.client_socket.sendto(b"second", self.address)
+        other_socket.sendto(b"third", self.address)
+        self.assertEqual(self.batch.receive(self.server_socket.fileno()), 3)
+        first, second = self.batch.address(0), self.batch.address(1)
+        self.assertEqual(first, self.client_socket.getsockname())
+        self.assertIs(second, first)
+        self.assertEqual(self.batch.address(2), other_socket.getsockname())
+
+    def test_receive_nothing_pending(self):
+        """An empty socket queue yields no datagram."""
+        self.assertEqual(self.batch.receive(self.server_socket.fileno()), 0)
+
+    def test_zerocopy_echo_burst(self):
+        """Lent buffers echo intact and are recycled by reap."""
+        if not _mmsg.enable_zerocopy(self.server_socket):
+            self.skipTest("MSG_ZEROCOPY is not available")
+        messages = [bytes([i]) * 30000 for i in range(4)]
+        for message in messages:
+            self.client_socket.sendto(message, self.address)
+        fd = self.server_socket.fileno()
+        count = self.batch.receive(fd)
+        self.assertEqual(count, len(messages))
+        lent = self.batch._buffers[:count]
+        self.assertEqual(self.batch.echo(fd, count, zerocopy=True), count)
+        if not self.batch._lent[fd]:
+            self.skipTest("the kernel fell back to copying")
+        self.assertEqual(list(self.batch._lent[fd].values()), lent)
+        self.assertTrue(all(b not in self.batch._buffers for b in lent))
+        for message in messages:
+            self.assertEqual(self.client_socket.recv(65536), self.PREFIX + message)
+
+        deadline = time.monotonic() + 1
+        while self.batch._lent[fd] and time.monotonic() < deadline:
+            self.batch.reap(self.server_socket)
+            time.sleep(0.01)
+        self.assertEqual(self.batch._lent[fd], {})
+        self.assertCountEqual(
+            [id(buffer) for buffer in self.batch._spares], [id(b) for b in lent]
+        )
+
+
+@skipUnless(_uring.available, "io_uring cannot be driven from this libc")
+class TestUringEcho(TestCase):
+    """Test cases for the io_uring echo of the _uring module."""
+
+    PREFIX = b"Echo: "
+
+    def setUp(self):
+        """Open loopback sockets and an io_uring echoing the server socket."""
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server_socket.bind(("127.0.0.1", 0))
+        self.server_socket.setblocking(False)
+        self.addCleanup(self.server_socket.close)
+        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.client_socket.bind(("127.0.0.1", 0))
+        self.client_socket.setblocking(False)
+        self.addCleanup(self.client_socket.close)
+        self.address = self.server_socket.getsockname()
+        try:
+            self.ring = _uring.UringEcho(
+                self.server_socket.fileno(), prefix=self.PREFIX
+            )
+        except OSError as os_error:
+            self.skipTest(f"io_uring cannot be set up: {os_error}")
+        self.addCleanup(self.ring.close)
+        self.received = []
+
+    def on_message(self, address: tuple, message: memoryview) -> None:
+        """Record a datagram the ring received."""
+        self.received.append((address, message.tobytes()))
+
+    def echo(self, messages: list) -> list:
+        """Send ``messages`` to the ring and return the replies, in order."""
+        for message in messages:
+            self.client_socket.sendto(message, self.address)
+        replies = []
+        deadline = time.monotonic() + 2
+        while len(replies) < len(messages) and time.monotonic() < deadline:
+            if select.select([self.ring.fileno()], [], [], 0.01)[0]:
+                self.ring.process(self.on_message)
+            while True:
+                try:
+                    replies.append(self.client_socket.recv(65536))
+                except BlockingIOError:
+                    break
+        return replies
+
+    def test_echo_messages(self):
+        """Short, large and empty datagrams are echoed by io_uring."""
+        messages = [b"hello", bytes(range(256)) * 80, b""]
+        self.assertEqual(self.echo(messages), [self.PREFIX + m for m in messages])
+        client_address = self.client_socket.getsockname()
+        self.assertEqual(self.received, [(client_address, m) for m in messages])
+
+    def test_echo_long_burst(self):
+        """A burst much longer than the ring is echoed in full."""
+        messages = [b"message %d" % i for i in range(200)]
+        replies = self.echo(messages)
+        self.assertCountEqual(replies, [self.PREFIX + m for m in messages])
+        self.assertCountEqual([message for _, message in self.received], messages)
+
+
+class CountedAddress(tuple):
+    """An address tuple counting how many times it is formatted."""
+
+    formatted = 0
+
+    def __str__(self) -> str:
+        CountedAddress.formatted += 1
+        return super().__str__()
+
+
+class TestMessageLog(IsolatedAsyncioTestCase):
+    """Test cases for the batched console output of the _msglog module."""
+
+    def setUp(self):
+        """Point sys.stdout at a pipe and create a message log."""
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self.read_fd = read_fd
+        self.addCleanup(os.close, read_fd)
+        stdout = open(write_fd, "w", encoding="utf-8")
+        self.addCleanup(stdout.close)
+        stdout_patch = patch.object(sys, "stdout", stdout)
+        stdout_patch.start()
+        self.addCleanup(stdout_patch.stop)
+        self.log = _msglog.MessageLog("From {address}: {message}\n", delay=0.01)
+
+    def output(self) -> bytes:
+        """Return what was written to stdout since the last call."""
+        try:
+            return os.read(self.read_fd, 1 << 20)
+        except BlockingIOError:
+            return b""
+
+    async def test_flush_full_batch(self):
+        """A full batch is written at once."""
+        for i in range(self.log.batch - 1):
+            self.log.append(("127.0.0.1", 1), b"%d" % i)
+        self.assertEqual(self.output(), b"")
+        self.log.append(("127.0.0.1", 1), b"last")
+        lines = self.output().splitlines()
+        self.assertEqual(len(lines), self.log.batch)
+        self.assertEqual(lines[-1], b"From ('127.0.0.1', 1): last")
+        self.assertIsNone(self.log._timer)
+
+    async def test_flush_after_delay(self):
+        """A partial batch is written once the delay expired."""
+        self.log.append(("127.0.0.1", 1), b"first")
+        self.assertIsNotNone(self.log._timer)
+        self.assertEqual(self.output(), b"")
+        await asyncio.sleep(self.log.delay * 5)
+        self.assertEqual(self.output(), b"From ('127.0.0.1', 1): first\n")
+        self.assertIsNone(self.log._timer)
+        self.log.append(("127.0.0.1", 1), b"second")
+        self.assertIsNotNone(self.log._timer)
+        await asyncio.sleep(self.log.delay * 5)
+        self.assertEqual(self.output(), b"From ('127.0.0.1', 1): second\n")
+
+    async def test_sender_header_per_run(self):
+        """The sender header is formatted once per run of the same sender."""
+        first = CountedAddress(("127.0.0.1", 1))
+        second = CountedAddress(("127.0.0.1", 2))
+        CountedAddress.formatted = 0
+        for address, message in ((first, b"a"), (first, b"b"), (second, b"c")):
+            self.log.append(address, message)
+        self.log.append(first, b"d")
+        self.log.flush()
+        self.assertEqual(CountedAddress.formatted, 3)
+        self.assertEqual(
+            self.output().splitlines(),
+            [
+                b"From ('127.0.0.1', 1): a",
+                b"From ('127.0.0.1', 1): b",
+                b"From ('127.0.0.1', 2): c",
+                b"From ('127.0.0.1', 1): d",
+            ],
+        )
+
+    async def test_undecodable_payload(self):
+        """Payloads are written as received, even when they are not UTF-8."""
+        self.log.append(("127.0.0.1", 1), b"\xff\xfe\x80")
+        self.log.flush()
+        self.assertEqual(self.output(), b"From ('127.0.0.1', 1): \xff\xfe\x80\n")
+
+
+class TestConsoleReader(IsolatedAsyncioTestCase):
+    """Test cases for the event loop driven console input of the _console module."""
+
+    async def asyncSetUp(self):
+        """Create a pipe standing in for stdin and a reader watching it."""
+        self.read_fd, self.write_fd = os.pipe()
+        self.addCleanup(os.close, self.read_fd)
+        self.lines = []
+        self.eof = asyncio.Event()
+        self.eofs = 0
+        self.reader = _console.ConsoleReader(
+            self.lines.append, self.on_eof, fd=self.read_fd
+        )
+        self.reader.start(asyncio.get_running_loop())
+        self.addCleanup(self.reader.stop)
+
+    def on_eof(self) -> None:
+        """Record the end of file."""
+        self.eofs += 1
+        self.eof.set()
+
+    async def write(self, data: bytes) -> None:
+        """Write ``data`` to the pipe and let the loop read it."""
+        os.write(self.write_fd, data)
+        await asyncio.sleep(0.01)
+
+    async def close(self) -> None:
+        """Close the write end of the pipe and wait for the end of file."""
+        os.close(self.write_fd)
+        await asyncio.wait_for(self.eof.wait(), 1)
+
+    async def test_line_split_across_reads(self):
+        """A line read in two parts is dispatched once, when complete."""
+        await self.write(b"hel")
+        self.assertEqual(self.lines, [])
+        await self.write(b"lo\nwor")
+        self.assertEqual(self.lines, [b"hello"])
+        await self.write(b"ld\n")
+        self.assertEqual(self.lines, [b"hello", b"world"])
+        await self.close()
+
+    async def test_lines_in_one_read(self):
+        """Every line of a single read is dispatched, in order."""
+        await self.write(b"one\ntwo\n\nthree\n")
+        self.assertEqual(self.lines, [b"one", b"two", b"", b"three"])
+        await self.close()
+
+    async def test_last_line_at_eof(self):
+        """An unterminated last line is dispatched at end of file."""
+        await self.write(b"first\nlast")
+        self.assertEqual(self.lines, [b"first"])
+        await self.close()
+        self.assertEqual(self.lines, [b"first", b"last"])
+
+    async def test_eof_callback(self):
+        """on_eof is called once and the reader stops watching stdin."""
+        await self.close()
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.eofs, 1)
+        self.assertEqual(self.lines, [])
+        self.assertFalse(self.reader._polled)
+        self.assertIsNone(self.reader._loop)
+
+    async def test_regular_file(self):
+        """A regular file, which epoll refuses, is read from loop callbacks."""
+        with tempfile.TemporaryFile() as regular_file:
+            regular_file.write(b"one\ntwo")
+            regular_file.seek(0)
+            lines = []
+            eof = asyncio.Event()
+            reader = _console.ConsoleReader(
+                lines.append, eof.set, fd=regular_file.fileno()
+            )
+            reader.start(asyncio.get_running_loop())
+            self.assertFalse(reader._polled)
+            await asyncio.wait_for(eof.wait(), 1)
+        self.assertEqual(lines, [b"one", b"two"])
+        os.close(self.write_fd)
+
 
 if __name__ == "__main__":
     unittest_main()